@@ -0,0 +1,243 @@
+import re
+import time
+import sqlite3
+import platform
+import statistics
+from colorama import Fore, Style
+
+# Local SQLite history of encode jobs, used to predict stage runtimes before and during a job.
+# Predictions are the median seconds-per-unit of matching past stages scaled to the new input,
+# where the unit is input duration when enough past runs have one and input size otherwise.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started REAL NOT NULL,
+    host TEXT,
+    input_name TEXT,
+    input_size INTEGER,
+    duration_s REAL,
+    atmos INTEGER,
+    atmos_mode TEXT,
+    bitrate_ddp INTEGER,
+    bitrate_atmos_5_1 INTEGER,
+    bitrate_atmos_7_1 INTEGER,
+    warp_mode TEXT,
+    bed_conform INTEGER,
+    elapsed_s REAL,
+    success INTEGER
+);
+CREATE TABLE IF NOT EXISTS stages (
+    job_id INTEGER NOT NULL REFERENCES jobs(id),
+    name TEXT NOT NULL,
+    elapsed_s REAL,
+    user_cpu_s REAL,
+    sys_cpu_s REAL,
+    max_rss_kb INTEGER,
+    returncode INTEGER,
+    bed_conform INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_stages_name ON stages(name);
+"""
+
+HISTORY_WINDOW = 20  # most recent matching runs considered per prediction
+MIN_SAMPLES = 3  # narrower match tiers need at least this many runs
+RECENT_RUNS = 5  # runs compared against older ones in --stats
+REGRESSION_THRESHOLD = 0.85  # recent throughput below this fraction of the baseline is flagged
+
+
+DURATION_LINE = re.compile(r"^\s*duration\s*[:=]?\s*(.+?)\s*$", re.I)
+DURATION_CLOCK = re.compile(r"(\d+):([0-5]\d):([0-5]\d(?:\.\d+)?)")
+DURATION_UNITS = re.compile(r"(?:(\d+)\s*h)?\s*(?:(\d+)\s*m(?:in)?)?\s*(?:(\d+(?:\.\d+)?)\s*s)?", re.I)
+DURATION_SECONDS = re.compile(r"(\d+(?:\.\d+)?)\s*(?:s|sec|secs|seconds)?", re.I)
+
+
+def parse_duration(info_text):
+    # The truehdd info layout has not been pinned down, so only a "Duration" field whose whole value
+    # is HH:MM:SS[.fff], "1h 23m 45s" or a bare seconds count is accepted. Anything else returns None
+    # and predictions fall back to input size rather than learning from a misparsed duration.
+    for line in info_text.splitlines():
+        m = DURATION_LINE.match(line)
+        if not m:
+            continue
+        value = m.group(1)
+        m = DURATION_CLOCK.fullmatch(value)
+        if m:
+            return int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3))
+        m = DURATION_UNITS.fullmatch(value)
+        if m and any(m.groups()):
+            h, mins, secs = m.groups()
+            return int(h or 0) * 3600 + int(mins or 0) * 60 + float(secs or 0)
+        m = DURATION_SECONDS.fullmatch(value)
+        if m:
+            return float(m.group(1))
+        return None
+    return None
+
+
+def _fmt_hms(secs):
+    return time.strftime("%H:%M:%S", time.gmtime(int(secs)))
+
+
+class JobHistory:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def record(self, report, params, success):
+        data = report.to_dict()
+        stages = data["stages"]
+        # Bed conform as applied per decode; the job-level value is NULL when decodes differ
+        # (Atmos "both" with bed conform on) or when nothing was decoded as Atmos
+        stage_bed_conform = params.get("stage_bed_conform") or {}
+        used = set(stage_bed_conform.values())
+        bed_conform = used.pop() if len(used) == 1 else None
+        with self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO jobs (started, host, input_name, input_size, duration_s, atmos, atmos_mode, "
+                "bitrate_ddp, bitrate_atmos_5_1, bitrate_atmos_7_1, warp_mode, bed_conform, elapsed_s, success) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    report.started,
+                    data["host"],
+                    data["input"],
+                    data["input_size"],
+                    params.get("duration_s"),
+                    params.get("atmos"),
+                    params.get("atmos_mode"),
+                    params.get("bitrate_ddp"),
+                    params.get("bitrate_atmos_5_1"),
+                    params.get("bitrate_atmos_7_1"),
+                    params.get("warp_mode"),
+                    bed_conform,
+                    data["elapsed_s"],
+                    int(success),
+                ),
+            )
+            job_id = cur.lastrowid
+            for st in stages:
+                u = st["usage"]
+                self.conn.execute(
+                    "INSERT INTO stages (job_id, name, elapsed_s, user_cpu_s, sys_cpu_s, max_rss_kb, returncode, "
+                    "bed_conform) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        job_id,
+                        st["name"],
+                        st["elapsed_s"],
+                        u.get("user_cpu_s"),
+                        u.get("sys_cpu_s"),
+                        u.get("max_rss_kb"),
+                        st["returncode"],
+                        stage_bed_conform.get(st["name"]),
+                    ),
+                )
+        return job_id
+
+    def _rates(self, stage_name, unit_col, filters):
+        where = ["s.name = ?", "s.returncode = 0", "s.elapsed_s IS NOT NULL", f"j.{unit_col} > 0"]
+        values = [stage_name]
+        for col, val in filters:
+            where.append(f"j.{col} = ?")
+            values.append(val)
+        rows = self.conn.execute(
+            f"SELECT s.elapsed_s / j.{unit_col} FROM stages s JOIN jobs j ON s.job_id = j.id "
+            f"WHERE {' AND '.join(where)} ORDER BY j.started DESC LIMIT ?",
+            values + [HISTORY_WINDOW],
+        ).fetchall()
+        return [r[0] for r in rows]
+
+    def predict_stage(self, stage_name, params):
+        # Returns (seconds, sample_count); seconds is None without usable history
+        host = platform.node()
+        tiers = [
+            [("host", host), ("warp_mode", params.get("warp_mode"))],
+            [("host", host)],
+            [],
+        ]
+        # Try every tier in both units before settling for an under-sampled match, so a single run
+        # with a parsed duration does not win over many runs that only have a size
+        candidates = []
+        for unit_col, amount in (("duration_s", params.get("duration_s")), ("input_size", params.get("input_size"))):
+            if not amount:
+                continue
+            for filters in tiers:
+                rates = self._rates(stage_name, unit_col, filters)
+                if len(rates) >= MIN_SAMPLES:
+                    return statistics.median(rates) * amount, len(rates)
+                if rates:
+                    candidates.append((rates, amount))
+        if candidates:
+            rates, amount = max(candidates, key=lambda c: len(c[0]))
+            return statistics.median(rates) * amount, len(rates)
+        return None, 0
+
+    def predict(self, stage_names, params):
+        return {name: self.predict_stage(name, params) for name in stage_names}
+
+    def print_prediction(self, predictions):
+        known = {n: p for n, p in predictions.items() if p[0] is not None}
+        if not known:
+            print(f"{Fore.CYAN}[INFO]{Style.RESET_ALL} No job history yet; runtime prediction unavailable.")
+            return
+        print(f"{Fore.CYAN}[INFO]{Style.RESET_ALL} Predicted runtime (from job history):")
+        totals = {}
+        for name, (secs, samples) in known.items():
+            kind = name.split(":", 1)[0]
+            totals[kind] = totals.get(kind, 0) + secs
+            print(f"  {name}: ~{_fmt_hms(secs)} ({samples} past runs)")
+        for kind in ("decode", "encode"):
+            if kind in totals:
+                print(f"  Total {kind}: ~{_fmt_hms(totals[kind])}")
+        missing = [n for n in predictions if n not in known]
+        if missing:
+            print(f"  No history for: {', '.join(missing)}")
+
+    def print_stats(self):
+        rows = self.conn.execute(
+            "SELECT s.name, j.started, j.host, s.elapsed_s, j.input_size, j.duration_s "
+            "FROM stages s JOIN jobs j ON s.job_id = j.id "
+            "WHERE s.returncode = 0 AND s.elapsed_s > 0 AND j.input_size > 0 "
+            "ORDER BY s.name, j.host, j.started"
+        ).fetchall()
+        if not rows:
+            print(f"{Fore.CYAN}[INFO]{Style.RESET_ALL} No job history recorded in {self.path}")
+            return
+
+        # Hosts differ in speed, so trends and regressions are tracked per (stage, host)
+        by_stage = {}
+        for name, started, host, elapsed, size, duration in rows:
+            mib_s = size / 1048576.0 / elapsed
+            speed = duration / elapsed if duration else None
+            by_stage.setdefault((name, host), []).append((started, mib_s, speed))
+
+        n_jobs = self.conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+        print(f"{Fore.CYAN}[INFO]{Style.RESET_ALL} Job history: {n_jobs} jobs in {self.path}")
+        for (name, host), runs in by_stage.items():
+            mib = [r[1] for r in runs]
+            speeds = [r[2] for r in runs if r[2] is not None]
+            line = f"  {name} on {host or 'unknown host'}: {len(runs)} runs, median {statistics.median(mib):.2f} MiB/s"
+            if speeds:
+                line += f", {statistics.median(speeds):.1f}x realtime"
+            print(line)
+
+            months = {}
+            for started, rate, _ in runs:
+                months.setdefault(time.strftime("%Y-%m", time.localtime(started)), []).append(rate)
+            for month, rates in months.items():
+                print(f"    {month}: {len(rates)} runs, median {statistics.median(rates):.2f} MiB/s")
+
+            if len(runs) > RECENT_RUNS:
+                recent = statistics.median(mib[-RECENT_RUNS:])
+                baseline = statistics.median(mib[:-RECENT_RUNS])
+                change = (recent / baseline - 1) * 100
+                if recent < baseline * REGRESSION_THRESHOLD:
+                    print(
+                        f"    {Fore.YELLOW}[WARN]{Style.RESET_ALL} Last {RECENT_RUNS} runs {change:+.0f}% "
+                        f"vs earlier runs ({recent:.2f} vs {baseline:.2f} MiB/s): possible regression"
+                    )
+                else:
+                    print(f"    Last {RECENT_RUNS} runs {change:+.0f}% vs earlier runs")
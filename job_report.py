@@ -0,0 +1,227 @@
+import os
+import sys
+import json
+import time
+import platform
+import threading
+import subprocess
+from colorama import Fore, Style
+
+# Per-stage resource accounting for truehdd / DEE child processes.
+# CPU time comes from wait4() rusage, I/O bytes from /proc/<pid>/io (Linux only).
+# Max RSS is sampled from VmHWM in /proc/<pid>/status while the child runs. rusage ru_maxrss is only
+# a fallback off Linux: it keeps the high-water mark from before exec, so it also counts the RSS of
+# the forking Python orchestrator and overstates small children such as truehdd.
+# The summary shows storage I/O (read_bytes/write_bytes); rchar/wchar, which also count pipes
+# and page-cache hits, are kept in the JSON report only.
+
+PROC_IO_FIELDS = ("rchar", "wchar", "read_bytes", "write_bytes")
+RSS_SAMPLE_INTERVAL = 0.2  # seconds between VmHWM samples
+
+
+def _read_proc_io(pid):
+    try:
+        with open(f"/proc/{pid}/io", "r") as fh:
+            values = {}
+            for line in fh:
+                key, _, val = line.partition(":")
+                if key in PROC_IO_FIELDS:
+                    values[key] = int(val.strip())
+            return values or None
+    except (OSError, ValueError):
+        return None
+
+
+def _read_vmhwm_kb(pid):
+    # Gone once the child is a zombie, so it must be read while the process is alive
+    try:
+        with open(f"/proc/{pid}/status", "r") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class RssSampler:
+    # Polls the child's VmHWM (peak RSS since exec) until the stage is waited on
+    def __init__(self, pid):
+        self.pid = pid
+        self.peak_kb = None
+        self._stop = threading.Event()
+        self._thread = None
+        if os.path.isdir("/proc"):
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    @property
+    def active(self):
+        return self._thread is not None
+
+    def sample(self):
+        kb = _read_vmhwm_kb(self.pid)
+        if kb is not None and (self.peak_kb is None or kb > self.peak_kb):
+            self.peak_kb = kb
+
+    def _run(self):
+        self.sample()
+        while not self._stop.wait(RSS_SAMPLE_INTERVAL):
+            self.sample()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+
+
+def _maxrss_kb(ru_maxrss):
+    # Linux reports kilobytes, macOS reports bytes
+    if sys.platform == "darwin":
+        return ru_maxrss // 1024
+    return ru_maxrss
+
+
+def wait_with_usage(process, sampler=None):
+    # Reap a Popen child ourselves so its rusage is not lost to Popen.wait()
+    usage = {
+        "user_cpu_s": None,
+        "sys_cpu_s": None,
+        "max_rss_kb": None,
+        "max_rss_source": None,
+        "io": None,
+    }
+    if sampler is not None:
+        sampler.sample()
+    if not hasattr(os, "wait4"):
+        process.wait()
+        return process.returncode, usage
+
+    pid = process.pid
+    if hasattr(os, "waitid") and hasattr(os, "WNOWAIT"):
+        # Wait for exit without reaping so /proc/<pid>/io is still readable
+        try:
+            os.waitid(os.P_PID, pid, os.WEXITED | os.WNOWAIT)
+            usage["io"] = _read_proc_io(pid)
+        except ChildProcessError:
+            pass
+    if sampler is not None:
+        sampler.stop()
+        if sampler.active:
+            usage["max_rss_kb"] = sampler.peak_kb
+            usage["max_rss_source"] = "VmHWM"
+
+    try:
+        _, status, ru = os.wait4(pid, 0)
+    except ChildProcessError:
+        # Already reaped elsewhere; fall back to whatever Popen knows
+        process.wait()
+        return process.returncode, usage
+
+    process.returncode = os.waitstatus_to_exitcode(status)
+    usage["user_cpu_s"] = round(ru.ru_utime, 3)
+    usage["sys_cpu_s"] = round(ru.ru_stime, 3)
+    if usage["max_rss_source"] is None:
+        usage["max_rss_kb"] = _maxrss_kb(ru.ru_maxrss)
+        usage["max_rss_source"] = "ru_maxrss"
+    return process.returncode, usage
+
+
+def _fmt_bytes(n):
+    if n is None:
+        return "-"
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(n) < 1024 or unit == "GiB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024.0
+
+
+def _fmt_secs(s):
+    return "-" if s is None else f"{s:.1f}s"
+
+
+class Stage:
+    def __init__(self, name, cmd):
+        self.name = name
+        self.cmd = [str(c) for c in cmd]
+        self.started = time.time()
+        self._t0 = time.monotonic()
+        self.elapsed_s = None
+        self.returncode = None
+        self.usage = {}
+        self.files = {}
+        self._sampler = None
+
+    def popen(self, **kwargs):
+        # Start the child and its RSS sampler; pair with wait() instead of Popen.wait()
+        process = subprocess.Popen(self.cmd, **kwargs)
+        self._sampler = RssSampler(process.pid)
+        return process
+
+    def wait(self, process):
+        rc, self.usage = wait_with_usage(process, self._sampler)
+        self.elapsed_s = round(time.monotonic() - self._t0, 3)
+        self.returncode = rc
+        return rc
+
+    def add_files(self, paths):
+        for p in paths:
+            if os.path.isfile(p):
+                self.files[os.path.basename(p)] = os.path.getsize(p)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "cmd": self.cmd,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "elapsed_s": self.elapsed_s,
+            "returncode": self.returncode,
+            "usage": self.usage,
+            "files": self.files,
+        }
+
+
+class JobReport:
+    def __init__(self, input_file):
+        self.input_file = input_file
+        self.started = time.time()
+        self.stages = []
+
+    def stage(self, name, cmd):
+        st = Stage(name, cmd)
+        self.stages.append(st)
+        return st
+
+    def to_dict(self):
+        input_size = os.path.getsize(self.input_file) if os.path.isfile(self.input_file) else None
+        return {
+            "input": os.path.basename(self.input_file),
+            "input_size": input_size,
+            "host": platform.node(),
+            "platform": platform.platform(),
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "elapsed_s": round(time.time() - self.started, 3),
+            "stages": [st.to_dict() for st in self.stages],
+        }
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(self.to_dict(), fh, indent=2)
+        return path
+
+    def print_summary(self):
+        if not self.stages:
+            return
+        print(f"{Fore.CYAN}[INFO]{Style.RESET_ALL} Per-stage resource usage:")
+        print(f"  {'stage':<32} {'wall':>9} {'user':>9} {'sys':>9} {'max rss':>11} {'disk read':>11} {'disk write':>11}")
+        for st in self.stages:
+            u = st.usage
+            io = u.get("io") or {}
+            rss = u.get("max_rss_kb")
+            print(
+                f"  {st.name:<32} {_fmt_secs(st.elapsed_s):>9} {_fmt_secs(u.get('user_cpu_s')):>9} "
+                f"{_fmt_secs(u.get('sys_cpu_s')):>9} {_fmt_bytes(None if rss is None else rss * 1024):>11} "
+                f"{_fmt_bytes(io.get('read_bytes')):>11} {_fmt_bytes(io.get('write_bytes')):>11}"
+            )
+            for fname, size in st.files.items():
+                print(f"    {fname}: {_fmt_bytes(size)}")
@@ -2,7 +2,9 @@ import os
 import sys
 import re
 import time
+import atexit
 import argparse
+import sqlite3
 import subprocess
 import platform
 from colorama import Fore, Style, init
@@ -11,11 +13,16 @@ from ddp_config import (
     create_xml_5_1_atmos,
     create_xml_7_1_atmos_bluray,
 )
+from job_report import JobReport
+from job_history import JobHistory, parse_duration
 
 init(autoreset=True)
 
 dee_path = None
 dee_cwd = None
+job_report = None
+job_predictions = {}
+job_completed = False
 
 # -------------------- Utilities -------------------- #
 
@@ -64,10 +71,12 @@ def sanitize_dee_xml(xml_path, clamp_to=1024):
         print(f"{Fore.YELLOW}[WARN]{Style.RESET_ALL} XML sanitize skipped: {e}")
 
 
-def run_dee(xml_file, job_dir, skip_validation=False):
+def run_dee(xml_file, job_dir, skip_validation=False, output_file=None):
     # Run DEE with optional xmllint bypass (needed for Blu‑ray 7.1 configs)
     xml_full = os.path.join(job_dir, xml_file)
     cmd = [dee_path, "-x", xml_full]
+    stage = job_report.stage(f"encode:{os.path.splitext(xml_file)[0]}", cmd)
+    predicted = job_predictions.get(stage.name, (None, 0))[0]
     env = os.environ.copy()
 
     shim_dir = None
@@ -87,8 +96,7 @@ def run_dee(xml_file, job_dir, skip_validation=False):
 
     start = time.time()
     try:
-        process = subprocess.Popen(
-            cmd,
+        process = stage.popen(
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             text=True,
@@ -103,7 +111,11 @@ def run_dee(xml_file, job_dir, skip_validation=False):
                 pct = float(m.group(1))
                 elapsed = time.time() - start
                 total = elapsed / (pct / 100) if pct else 0
-                remaining = max(0, int(total - elapsed)) if pct else 0
+                if predicted:
+                    # Lean on the history prediction early, on DEE's own progress later
+                    weight = pct / 100
+                    total = weight * total + (1 - weight) * max(predicted, elapsed)
+                remaining = max(0, int(total - elapsed))
                 filled = int(40 * pct // 100)
                 bar = "■" * filled + "-" * (40 - filled)
                 sys.stdout.write(
@@ -112,8 +124,10 @@ def run_dee(xml_file, job_dir, skip_validation=False):
                 )
                 sys.stdout.flush()
 
-        process.wait()
+        stage.wait(process)
         elapsed = time.time() - start
+        if output_file:
+            stage.add_files([os.path.join(job_dir, output_file)])
         if process.returncode != 0:
             print(f"\n{Fore.RED}[ERROR]{Style.RESET_ALL} DEE failed (exit {process.returncode}). Last output:")
             print("\n".join(log_lines[-40:]))
@@ -132,7 +146,7 @@ def run_dee(xml_file, job_dir, skip_validation=False):
 # -------------------- Arguments -------------------- #
 
 parser = argparse.ArgumentParser(description="TrueHD to DDP encoder with Atmos support")
-parser.add_argument("-i", "--input", required=True, help="Input TrueHD (.thd) file path")
+parser.add_argument("-i", "--input", help="Input TrueHD (.thd) file path")
 
 # Non‑Atmos 5.1 (PCM -> DD+)
 parser.add_argument(
@@ -197,10 +211,45 @@ parser.set_defaults(bed_conform=True)
 
 parser.add_argument("--dee-dir", help="Directory containing the Dolby Encoding Engine (DEE).")
 parser.add_argument("--truehdd-dir", help="Directory containing the TrueHDD executable.")
+parser.add_argument(
+    "--profile",
+    action="store_true",
+    help="Run cProfile on the orchestrator and save the stats next to the outputs.",
+)
+
+# Job history
+parser.add_argument("--history-db", help="Job history database (default: job_history.db next to main.py).")
+parser.add_argument("--no-history", action="store_true", help="Do not record this job in the job history.")
+parser.add_argument(
+    "--predict-only",
+    action="store_true",
+    help="Analyze the input, print the predicted runtime and exit without encoding.",
+)
+parser.add_argument(
+    "--stats",
+    action="store_true",
+    help="Print throughput trends from the job history and exit (no input needed).",
+)
 args = parser.parse_args()
 
 # -------------------- Setup -------------------- #
 
+script_dir = os.path.dirname(os.path.abspath(__file__))
+history_path = os.path.abspath(args.history_db) if args.history_db else os.path.join(script_dir, "job_history.db")
+
+if args.stats:
+    try:
+        history = JobHistory(history_path)
+        history.print_stats()
+        history.close()
+    except sqlite3.Error as e:
+        print(f"{Fore.RED}[ERROR]{Style.RESET_ALL} Could not read job history: {e}")
+        sys.exit(1)
+    sys.exit(0)
+
+if not args.input:
+    parser.error("the following arguments are required: -i/--input")
+
 input_file = os.path.abspath(args.input)
 input_name = os.path.basename(input_file)
 
@@ -209,11 +258,64 @@ if not os.path.isfile(input_file):
     print(f"{Fore.RED}[ERROR]{Style.RESET_ALL} File does not exist: {input_name}")
     sys.exit(1)
 
-script_dir = os.path.dirname(os.path.abspath(__file__))
 final_out_dir = os.path.join(script_dir, "ddp_encode")
 os.makedirs(final_out_dir, exist_ok=True)
 print(f"{Fore.CYAN}[INFO]{Style.RESET_ALL} Output directory: {os.path.basename(final_out_dir)}")
 
+base_name = os.path.splitext(os.path.basename(input_file))[0]
+job_report = JobReport(input_file)
+orchestrator_profile = None
+if args.profile:
+    import cProfile
+    orchestrator_profile = cProfile.Profile()
+    orchestrator_profile.enable()
+
+job_params = {
+    "input_size": os.path.getsize(input_file),
+    "duration_s": None,
+    "atmos": None,
+    "atmos_mode": args.atmos_mode,
+    "bitrate_ddp": args.bitrate_ddp,
+    "bitrate_atmos_5_1": args.bitrate_atmos_5_1,
+    "bitrate_atmos_7_1": args.bitrate_atmos_7_1,
+    "warp_mode": args.warp_mode,
+    "stage_bed_conform": {},
+}
+history = None
+try:
+    history = JobHistory(history_path)
+except sqlite3.Error as e:
+    print(f"{Fore.YELLOW}[WARN]{Style.RESET_ALL} Job history unavailable: {e}")
+
+
+def finish_job():
+    # Runs on every exit (including sys.exit on failure) so partial jobs still get a report
+    if orchestrator_profile is not None:
+        import pstats
+        orchestrator_profile.disable()
+        prof_path = build_path_in(final_out_dir, f"{base_name}_orchestrator.prof")
+        orchestrator_profile.dump_stats(prof_path)
+        print(f"{Fore.CYAN}[INFO]{Style.RESET_ALL} Orchestrator profile saved: {prof_path}")
+        pstats.Stats(orchestrator_profile).sort_stats("cumulative").print_stats(15)
+    # A predict-only run holds just the info probe; keep the last real report intact
+    if job_report.stages and not args.predict_only:
+        job_report.print_summary()
+        try:
+            report_path = job_report.save(build_path_in(final_out_dir, f"{base_name}_resources.json"))
+            print(f"{Fore.CYAN}[INFO]{Style.RESET_ALL} Resource report saved: {report_path}")
+        except OSError as e:
+            print(f"{Fore.YELLOW}[WARN]{Style.RESET_ALL} Could not save resource report: {e}")
+    if history is not None:
+        if job_report.stages and not (args.no_history or args.predict_only):
+            try:
+                history.record(job_report, job_params, success=job_completed)
+            except sqlite3.Error as e:
+                print(f"{Fore.YELLOW}[WARN]{Style.RESET_ALL} Could not record job history: {e}")
+        history.close()
+
+
+atexit.register(finish_job)
+
 # Resolve TrueHDD
 truehdd_exec_name = get_executable_name("truehdd")
 truehdd_dir = args.truehdd_dir or os.environ.get("TRUEHDD_DIR")
@@ -230,38 +332,46 @@ else:
     truehdd_path = check_tool(truehdd_exec_name, "TrueHD Decoder")
     truehdd_cwd = os.path.dirname(os.path.abspath(truehdd_path))
 
-# Resolve DEE
-dee_dir = args.dee_dir or os.environ.get("DEE_DIR") or os.environ.get("DEE_HOME")
-dee_exec_name = get_executable_name("dee")
-if dee_dir:
-    dee_dir = os.path.abspath(dee_dir)
-    dee_path = os.path.join(dee_dir, dee_exec_name)
-    print(f"{Fore.CYAN}[INFO]{Style.RESET_ALL} Using DEE directory: {dee_dir}")
-    if not os.path.isfile(dee_path):
-        print(f"{Fore.RED}[ERROR]{Style.RESET_ALL} Could not find {dee_exec_name} in {dee_dir}")
-        sys.exit(1)
-    dee_cwd = dee_dir
-    print(f"{Fore.GREEN}[OK]{Style.RESET_ALL} Found Dolby Encoding Engine: {dee_path}")
-else:
-    dee_path = check_tool(dee_exec_name, "Dolby Encoding Engine")
-    dee_cwd = os.path.dirname(os.path.abspath(dee_path))
+# Resolve DEE (predict-only never encodes, so it does not need it)
+if not args.predict_only:
+    dee_dir = args.dee_dir or os.environ.get("DEE_DIR") or os.environ.get("DEE_HOME")
+    dee_exec_name = get_executable_name("dee")
+    if dee_dir:
+        dee_dir = os.path.abspath(dee_dir)
+        dee_path = os.path.join(dee_dir, dee_exec_name)
+        print(f"{Fore.CYAN}[INFO]{Style.RESET_ALL} Using DEE directory: {dee_dir}")
+        if not os.path.isfile(dee_path):
+            print(f"{Fore.RED}[ERROR]{Style.RESET_ALL} Could not find {dee_exec_name} in {dee_dir}")
+            sys.exit(1)
+        dee_cwd = dee_dir
+        print(f"{Fore.GREEN}[OK]{Style.RESET_ALL} Found Dolby Encoding Engine: {dee_path}")
+    else:
+        dee_path = check_tool(dee_exec_name, "Dolby Encoding Engine")
+        dee_cwd = os.path.dirname(os.path.abspath(dee_path))
 
 # -------------------- Analyze Stream -------------------- #
 
 print(f"{Fore.CYAN}[INFO]{Style.RESET_ALL} Analyzing TrueHD stream...\n")
 atmos_flag = None
 try:
-    result = subprocess.run(
-        [truehdd_path, "info", input_file],
-        capture_output=True,
+    info_cmd = [truehdd_path, "info", input_file]
+    stage = job_report.stage("info", info_cmd)
+    process = stage.popen(
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
         text=True,
-        check=True,
         cwd=truehdd_cwd,
     )
-    for line in result.stdout.splitlines():
+    info_out = process.stdout.read()
+    process.stdout.close()
+    if stage.wait(process) != 0:
+        raise subprocess.CalledProcessError(process.returncode, info_cmd)
+    for line in info_out.splitlines():
         if "Dolby Atmos" in line:
             atmos_flag = line.split()[-1].lower()
             break
+    job_params["duration_s"] = parse_duration(info_out)
+    job_params["atmos"] = atmos_flag == "true"
     if atmos_flag == "true":
         print(f"{Fore.YELLOW}[INFO]{Style.RESET_ALL} Dolby Atmos detected.")
     elif atmos_flag == "false":
@@ -282,6 +392,25 @@ else:
         print(f"  Atmos 7.1 bitrate: {args.bitrate_atmos_7_1} kbps")
 print(f"  Warp mode: {args.warp_mode}")
 
+if atmos_flag == "true":
+    planned_stages = []
+    if args.atmos_mode in ["5.1", "both"]:
+        planned_stages += ["decode:ddp_encode_5_1", "encode:ddp_encode_atmos_5_1"]
+    if args.atmos_mode in ["7.1", "both"]:
+        planned_stages += ["decode:ddp_encode_7_1", "encode:ddp_encode_atmos_7_1"]
+else:
+    planned_stages = ["decode:ddp_encode_pcm", "encode:ddp_encode_5_1"]
+
+if history is not None:
+    try:
+        job_predictions = history.predict(planned_stages, job_params)
+        history.print_prediction(job_predictions)
+    except sqlite3.Error as e:
+        print(f"{Fore.YELLOW}[WARN]{Style.RESET_ALL} Runtime prediction skipped: {e}")
+
+if args.predict_only:
+    sys.exit(0)
+
 # -------------------- Decode helpers -------------------- #
 
 
@@ -309,7 +438,9 @@ def decode_mezz(out_dir, bed_conform_flag):
         decode_cmd.append("--bed-conform")
 
     print(f"{Fore.CYAN}[INFO]{Style.RESET_ALL} Starting decoding into {os.path.basename(out_dir)}...\n")
-    rc = subprocess.run(decode_cmd, cwd=truehdd_cwd).returncode
+    stage = job_report.stage(f"decode:{mezz_base}", decode_cmd)
+    job_params["stage_bed_conform"][stage.name] = bed_conform_flag
+    rc = stage.wait(stage.popen(cwd=truehdd_cwd))
     if rc != 0:
         print(f"{Fore.RED}[ERROR]{Style.RESET_ALL} Decoding failed.")
         sys.exit(1)
@@ -326,13 +457,13 @@ def decode_mezz(out_dir, bed_conform_flag):
                             os.remove(dest)
                         os.rename(src, dest)
 
+    stage.add_files(build_path_in(out_dir, n) for n in targets.values())
     print(f"{Fore.CYAN}[INFO]{Style.RESET_ALL} Decoding completed for {os.path.basename(out_dir)}.\n")
     return f"{mezz_base}.atmos"
 
 
 # -------------------- Run pipelines -------------------- #
 
-base_name = os.path.splitext(os.path.basename(input_file))[0]
 work_51 = os.path.join(script_dir, "ddp_encode_5_1")
 work_71 = os.path.join(script_dir, "ddp_encode_7_1")
 
@@ -349,7 +480,7 @@ if atmos_flag == "true":
             work_51, atmos_file_51, tmp_out_5_1, args.bitrate_atmos_5_1, xml_5_1
         )
         sanitize_dee_xml(build_path_in(work_51, xml_5_1))
-        rc = run_dee(xml_5_1, job_dir=work_51, skip_validation=False)
+        rc = run_dee(xml_5_1, job_dir=work_51, skip_validation=False, output_file=tmp_out_5_1)
         if rc != 0:
             sys.exit(1)
 
@@ -372,7 +503,7 @@ if atmos_flag == "true":
         )
 
         # Bypass DEE's online schema validation for Blu‑ray profile
-        rc = run_dee(xml_7_1, job_dir=work_71, skip_validation=True)
+        rc = run_dee(xml_7_1, job_dir=work_71, skip_validation=True, output_file=tmp_out_7_1)
         if rc != 0:
             sys.exit(1)
 
@@ -385,6 +516,7 @@ if atmos_flag == "true":
         if os.path.isdir(d):
             remove_files(d, (".xml", ".atmos", ".metadata", ".audio"))
 
+    job_completed = True
     print(f"{Fore.GREEN}[OK]{Style.RESET_ALL} Done. Outputs:")
     for t in targets:
         print(f"  - {t}")
@@ -408,7 +540,8 @@ else:
         "w64",
     ]
     print(f"{Fore.CYAN}[INFO]{Style.RESET_ALL} Starting W64 decoding...\n")
-    rc = subprocess.run(decode_cmd, cwd=truehdd_cwd).returncode
+    decode_stage = job_report.stage("decode:ddp_encode_pcm", decode_cmd)
+    rc = decode_stage.wait(decode_stage.popen(cwd=truehdd_cwd))
     if rc != 0:
         print(f"{Fore.RED}[ERROR]{Style.RESET_ALL} Decoding failed.")
         sys.exit(1)
@@ -430,6 +563,7 @@ else:
                 audio_in_name = dest_name
                 break
         if audio_in_name:
+            decode_stage.add_files([build_path_in(work_pcm, audio_in_name)])
             break
     
     if not audio_in_name:
@@ -444,7 +578,7 @@ else:
     print(f"{Fore.CYAN}[INFO]{Style.RESET_ALL} Creating DDP 5.1 XML...")
     create_xml_5_1(work_pcm, audio_in_name, tmp_out, args.bitrate_ddp, xml_pcm)
     
-    rc = run_dee(xml_pcm, job_dir=work_pcm, skip_validation=False)
+    rc = run_dee(xml_pcm, job_dir=work_pcm, skip_validation=False, output_file=tmp_out)
     if rc != 0:
         sys.exit(1)
     
@@ -454,4 +588,5 @@ else:
     # Clean both possible extensions
     remove_files(work_pcm, (".xml", ".w64", ".wav"))
     
+    job_completed = True
     print(f"{Fore.GREEN}[OK]{Style.RESET_ALL} Done. Output: {dst}")